@@ -4,139 +4,403 @@ This version includes additional features like conversation history,
 source citations, and better error handling.
 """
 
-from langchain_ollama import OllamaLLM
 from langchain_community.tools import DuckDuckGoSearchRun
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough
-from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import Runnable
+from collections import OrderedDict, deque
 from datetime import datetime
-import json
+import concurrent.futures
+import functools
+import hashlib
+import os
+import time
+import ollama
+import orjson
+
+# How long a cached search result stays fresh (seconds)
+SEARCH_CACHE_TTL = 300
+
+# Fold history into the running summary once this many exchanges have
+# rotated out of the verbatim tail
+SUMMARY_BATCH = 3
+
+# How many responses the content-hash cache keeps
+RESPONSE_CACHE_SIZE = 128
+
+class SessionOllamaLLM(Runnable):
+    """Drop-in Runnable around the native Ollama client that keeps the
+    server-side KV cache warm across turns.
+
+    LangChain's OllamaLLM discards the `context` token array Ollama
+    returns with each generation, so the server has to re-prefill the
+    whole conversation every turn. This wrapper threads that array back
+    into the next request, so each turn only prefills the new prompt.
+    """
+
+    def __init__(self, model, options=None):
+        self.model = model
+        self.client = ollama.Client()
+        self.options = options or {}
+        self._last_context = None
+
+    def _to_prompt(self, input):
+        return input.to_string() if hasattr(input, "to_string") else str(input)
+
+    def invoke(self, input, config=None, **kwargs):
+        response = self.client.generate(
+            model=self.model,
+            prompt=self._to_prompt(input),
+            context=self._last_context,
+            options=self.options,
+        )
+        self._last_context = response.get("context")
+        return response["response"]
+
+    def stream(self, input, config=None, **kwargs):
+        for part in self.client.generate(
+            model=self.model,
+            prompt=self._to_prompt(input),
+            context=self._last_context,
+            options=self.options,
+            stream=True,
+        ):
+            if part.get("context"):
+                self._last_context = part["context"]
+            yield part.get("response", "")
+
+    def reset_session(self):
+        """Forget the server-side conversation state"""
+        self._last_context = None
+
+    @property
+    def has_session(self):
+        return self._last_context is not None
+
+    def generate_stateless(self, prompt):
+        """One-off generation that leaves the session context untouched"""
+        return self.client.generate(
+            model=self.model, prompt=prompt, options=self.options
+        )["response"]
 
 class AdvancedRAGAssistant:
-    def __init__(self, model_name="gpt-oss:120b-cloud"):
-        self.llm = OllamaLLM(model=model_name)
+    def __init__(self, model_name="gpt-oss:120b-cloud", *,
+                 num_ctx=4096, num_batch=2048, num_thread=None):
+        # Decode is memory-bandwidth bound, so fewer bytes moved per
+        # weight wins: pick a quantized model tag (e.g. llama3:8b-instruct-q4_K_M)
+        # where available, keep the KV cache in fp16 and batch the prefill
+        self.llm = SessionOllamaLLM(model=model_name, options={
+            "num_ctx": num_ctx,
+            "num_batch": num_batch,
+            "num_thread": num_thread or os.cpu_count(),
+            "f16_kv": True,
+            "use_mmap": True,
+        })
         self.search = DuckDuckGoSearchRun()
-        self.conversation_history = []
-        
-        # Enhanced prompt with source citation
-        self.prompt = ChatPromptTemplate.from_template("""
-        You are a helpful AI assistant with access to real-time information.
-        Use the following context from web search results to answer the user's question.
-        
-        IMPORTANT: 
-        - If you use information from the search results, mention that it's from recent web search
-        - Be specific about what information comes from search vs your training knowledge
-        - If the search results don't contain relevant information, rely on your general knowledge
-        
-        Previous conversation context:
-        {history}
-        
-        Current web search results:
-        {context}
-        
-        Current question: {question}
-        
-        Provide a helpful, accurate answer:
-        """)
+        # Bounded deque of (unix_time, question, answer) tuples: appends
+        # evict the oldest in O(1) and nothing is string-formatted until
+        # actually rendered or saved
+        self.conversation_history = deque(maxlen=10)
+        # Per-instance TTL'd LRU cache so repeated/rephrased questions
+        # skip the 300-1500ms DuckDuckGo round-trip entirely
+        self._search_cached = functools.lru_cache(maxsize=256)(self._run_search)
+        # Single worker keeps saves ordered while the REPL stays responsive
+        self._io_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        # Append-only JSONL log: every turn is persisted with one O(1)
+        # write instead of rewriting the whole file on 'save'
+        self._log_filename = "conversation_log.jsonl"
+        # Summarize-once-then-reuse history state: older exchanges get
+        # folded into a running summary so a re-seeded session prefills
+        # O(summary + 2 verbatim turns) instead of the whole conversation
+        self.history_summary = ""
+        self._verbatim_tail = deque(maxlen=2)
+        self._summary_backlog = []
+        # In-flight background summarization: (future, batch) or None
+        self._pending_fold = None
+        # Command dispatch built once; a single dict lookup replaces the
+        # chained list-membership checks on every turn
+        self._commands = {
+            'exit': self._cmd_exit,
+            'quit': self._cmd_exit,
+            'bye': self._cmd_exit,
+            'goodbye': self._cmd_exit,
+            'save': self._cmd_save,
+            'clear': self._cmd_clear,
+            'clear history': self._cmd_clear,
+            'clear cache': self._cmd_clear_cache,
+            'clear search cache': self._cmd_clear_cache,
+        }
         
-        # Build the enhanced chain
-        self.chain = (
-            RunnablePassthrough.assign(
-                context=lambda x: self.search_with_error_handling(x["question"]),
-                history=lambda x: self.format_history()
-            )
-            | self.prompt
-            | self.llm
-            | StrOutputParser()
-        )
+        # Enhanced prompt with source citation. All static instructions
+        # live in the system message so the prompt prefix is identical
+        # every turn and Ollama's prefix-matched KV cache stays warm;
+        # dynamic history/context/question only appear at the end.
+        self.prompt = ChatPromptTemplate.from_messages([
+            ("system", """You are a helpful AI assistant with access to real-time information.
+Use the context from web search results to answer the user's question.
+
+IMPORTANT:
+- If you use information from the search results, mention that it's from recent web search
+- Be specific about what information comes from search vs your training knowledge
+- If the search results don't contain relevant information, rely on your general knowledge"""),
+            ("human", """{history}Current web search results:
+{context}
+
+Current question: {question}
+
+Provide a helpful, accurate answer:"""),
+        ])
+
+        # Response cache keyed on a hash of the fully rendered prompt:
+        # identical question + search context + history skips the model
+        # round-trip entirely (upgradable to embedding similarity later)
+        self._resp_cache = OrderedDict()
     
+    def _run_search(self, question, bucket):
+        """Uncached search; wrapped by lru_cache in __init__ (bucket gives the TTL)"""
+        return self.search.run(question)
+
     def search_with_error_handling(self, question):
-        """Search with better error handling"""
+        """Search with better error handling and a 5-minute result cache"""
         try:
-            results = self.search.run(question)
-            return results
+            bucket = int(time.time() // SEARCH_CACHE_TTL)
+            return self._search_cached(question.strip().lower(), bucket)
         except Exception as e:
             return f"Search unavailable: {str(e)}. Using general knowledge only."
+
+    def clear_search_cache(self):
+        """Drop all cached search results"""
+        self._search_cached.cache_clear()
     
     def format_history(self):
-        """Format recent conversation history"""
-        if not self.conversation_history:
-            return "No previous conversation."
-        
-        # Keep last 3 exchanges to avoid context overflow
-        recent_history = self.conversation_history[-6:]  # 3 Q&A pairs
-        formatted = []
-        
-        for i in range(0, len(recent_history), 2):
-            if i + 1 < len(recent_history):
-                q = recent_history[i]
-                a = recent_history[i + 1]
-                formatted.append(f"Q: {q}\nA: {a[:200]}...")  # Truncate long answers
-        
-        return "\n\n".join(formatted)
-    
+        """Compact history preamble for re-seeding a fresh session.
+
+        While a server session is active the KV cache already holds the
+        conversation, so this returns an empty string and nothing is
+        re-sent. After a session reset it returns the running summary
+        plus the last couple of verbatim exchanges.
+        """
+        if self.llm.has_session:
+            return ""
+
+        parts = []
+        if self.history_summary:
+            parts.append(f"Summary of earlier conversation:\n{self.history_summary}")
+        if self._verbatim_tail:
+            recent = "\n\n".join(f"Q: {q}\nA: {a}" for q, a in self._verbatim_tail)
+            parts.append(f"Recent exchanges:\n{recent}")
+
+        if not parts:
+            return ""
+        return "Previous conversation context:\n" + "\n\n".join(parts) + "\n\n"
+
+    def _summarize(self, batch, existing_summary):
+        """Runs on the I/O executor: pure LLM summarization through a
+        stateless generate call; no assistant state is touched here"""
+        exchanges = "\n".join(f"Q: {q}\nA: {a}" for q, a in batch)
+        prompt = (
+            "Merge the existing summary and the new exchanges into one updated "
+            "summary of the conversation, under 100 words. Keep only facts "
+            "needed to continue the conversation.\n\n"
+            f"Existing summary: {existing_summary or '(none)'}\n\n"
+            f"New exchanges:\n{exchanges}\n\n"
+            "Updated summary:"
+        )
+        return self.llm.generate_stateless(prompt).strip()
+
+    def _apply_summary_fold(self):
+        """Called on the main thread at a turn boundary: adopt a
+        finished background summarization, then restart the server
+        session so its KV cache stops growing - the next turn re-seeds
+        from the summary via format_history. Applying the reset and
+        state swaps here means they can never interleave with an
+        in-flight stream on the session LLM."""
+        if self._pending_fold is None:
+            return
+        future, batch = self._pending_fold
+        if not future.done():
+            return
+        self._pending_fold = None
+
+        try:
+            self.history_summary = future.result()
+            self.llm.reset_session()
+        except Exception as e:
+            print(f"⚠️ History summarization failed: {e}")
+            self._summary_backlog = batch + self._summary_backlog  # retry later
+
+    def generate_response(self, question):
+        """Render the prompt, consult the response cache, and stream the
+        answer; returns the full response text.
+
+        Conversation memory lives in the Ollama server's KV cache
+        (threaded through SessionOllamaLLM); {history} is empty while a
+        session is active and carries the compact summary preamble only
+        when a fresh session is seeded.
+        """
+        context = self.search_with_error_handling(question)
+        prompt_text = self.prompt.format(
+            history=self.format_history(), context=context, question=question
+        )
+
+        # Only use the cache while no server session is active: with a
+        # live session the prompt text omits the conversation (it lives
+        # in the server's KV cache), so identical prompts can belong to
+        # different conversation states, and serving a cached reply
+        # would also desync the session from the visible transcript
+        use_cache = not self.llm.has_session
+        if use_cache:
+            key = hashlib.blake2b(prompt_text.encode(), digest_size=16).digest()
+            cached = self._resp_cache.get(key)
+            if cached is not None:
+                self._resp_cache.move_to_end(key)
+                print(f"🤖: {cached}")
+                return cached
+
+        print("🤖: ", end="", flush=True)
+        chunks = []
+        for chunk in self.llm.stream(prompt_text):
+            print(chunk, end="", flush=True)
+            chunks.append(chunk)
+        print()
+
+        response = "".join(chunks)
+        if use_cache:
+            self._resp_cache[key] = response
+            while len(self._resp_cache) > RESPONSE_CACHE_SIZE:
+                self._resp_cache.popitem(last=False)
+        return response
+
     def add_to_history(self, question, answer):
         """Add Q&A to conversation history"""
-        timestamp = datetime.now().strftime("%H:%M")
-        self.conversation_history.extend([
-            f"[{timestamp}] {question}",
-            f"[{timestamp}] {answer}"
-        ])
-        
-        # Keep history manageable (last 20 entries)
-        if len(self.conversation_history) > 20:
-            self.conversation_history = self.conversation_history[-20:]
+        # Store the raw timestamp; it only gets formatted if a save
+        # actually needs it
+        timestamp = time.time()
+        self.conversation_history.append((timestamp, question, answer))
+
+        # Persist the turn incrementally; crash-safe and O(1) per turn
+        self._io_executor.submit(
+            self._append_log, {"t": timestamp, "q": question, "a": answer}
+        )
+
+        # Truncate once at write time; format_history and the summary
+        # fold read the stored text as-is instead of re-slicing
+        answer_trunc = answer if len(answer) <= 200 else answer[:200] + "…"
+
+        # Rotate the oldest verbatim exchange toward the summary and
+        # kick off a background summarization once enough accumulated;
+        # one fold at a time, adopted later by _apply_summary_fold
+        if len(self._verbatim_tail) == self._verbatim_tail.maxlen:
+            self._summary_backlog.append(self._verbatim_tail[0])
+        self._verbatim_tail.append((question, answer_trunc))
+        if len(self._summary_backlog) >= SUMMARY_BATCH and self._pending_fold is None:
+            batch, self._summary_backlog = self._summary_backlog, []
+            future = self._io_executor.submit(self._summarize, batch, self.history_summary)
+            self._pending_fold = (future, batch)
     
-    def save_conversation(self, filename="conversation_log.json"):
-        """Save conversation to file"""
+    def _append_log(self, record):
+        """Runs on the I/O executor: append one turn to the JSONL log"""
+        try:
+            with open(self._log_filename, 'ab') as f:
+                f.write(orjson.dumps(record) + b"\n")
+        except Exception as e:
+            print(f"❌ Could not append to {self._log_filename}: {e}")
+
+    def _export_json(self, filename):
+        """Runs on the I/O executor: coalesce the JSONL log into the
+        nested JSON format; timestamps get formatted here, the only
+        place they're shown"""
+        history = []
+        try:
+            with open(self._log_filename, 'rb') as f:
+                for line in f:
+                    if line.strip():
+                        record = orjson.loads(line)
+                        history.append({
+                            "time": datetime.fromtimestamp(record["t"]).strftime("%H:%M"),
+                            "question": record["q"],
+                            "answer": record["a"],
+                        })
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"❌ Could not read {self._log_filename}: {e}")
+            return
+
         conversation_data = {
             "timestamp": datetime.now().isoformat(),
-            "history": self.conversation_history
+            "history": history
         }
-        
         try:
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(conversation_data, f, indent=2, ensure_ascii=False)
+            # orjson serializes straight to UTF-8 bytes, much faster
+            # than stdlib json on long Unicode-heavy histories
+            with open(filename, 'wb') as f:
+                f.write(orjson.dumps(conversation_data, option=orjson.OPT_INDENT_2))
             print(f"💾 Conversation saved to {filename}")
         except Exception as e:
             print(f"❌ Could not save conversation: {e}")
+
+    def save_conversation(self, filename="conversation_log.json"):
+        """Export the conversation as nested JSON in the background.
+
+        Turns are already persisted incrementally to the JSONL log, so
+        this just builds the human-friendly view on demand.
+        """
+        self._io_executor.submit(self._export_json, filename)
     
+    def _cmd_exit(self):
+        print("🤖 Goodbye! Thanks for chatting!")
+        return False
+
+    def _cmd_save(self):
+        self.save_conversation()
+        return True
+
+    def _cmd_clear(self):
+        self.conversation_history.clear()
+        self.history_summary = ""
+        self._verbatim_tail.clear()
+        self._summary_backlog = []
+        self._pending_fold = None
+        self.llm.reset_session()
+        print("🤖 Conversation history cleared!")
+        return True
+
+    def _cmd_clear_cache(self):
+        self.clear_search_cache()
+        print("🤖 Search cache cleared!")
+        return True
+
     def run(self):
         """Main interactive loop"""
         print("🤖 Advanced Real-Time AI Assistant is ready!")
         print("🤖 Features: Web search, conversation memory, source citations")
-        print("🤖 Commands: 'exit', 'save', 'clear history'")
+        print("🤖 Commands: 'exit', 'save', 'clear history', 'clear cache'")
         print("🤖 Hello! What would you like to know?")
-        
+
         while True:
             try:
                 user_question = input("\nYou: ").strip()
-                
-                # Handle special commands
-                if user_question.lower() in ['exit', 'quit', 'bye', 'goodbye']:
-                    print("🤖 Goodbye! Thanks for chatting!")
-                    break
-                
-                if user_question.lower() == 'save':
-                    self.save_conversation()
-                    continue
-                
-                if user_question.lower() in ['clear history', 'clear']:
-                    self.conversation_history = []
-                    print("🤖 Conversation history cleared!")
+
+                # Handle special commands; handlers return False to quit
+                handler = self._commands.get(user_question.lower())
+                if handler is not None:
+                    if not handler():
+                        break
                     continue
-                
+
                 if not user_question:
                     continue
                 
                 print("🤖 Searching and thinking...")
-                
-                # Get response from the chain
-                response = self.chain.invoke({"question": user_question})
-                
-                # Add to history and display
+
+                # Adopt any finished history fold at the turn boundary,
+                # while no generation is in flight
+                self._apply_summary_fold()
+
+                # Streams token by token on a cache miss; cache hits
+                # print the stored response instantly
+                response = self.generate_response(user_question)
                 self.add_to_history(user_question, response)
-                print(f"🤖: {response}")
                 
             except KeyboardInterrupt:
                 print("\n🤖 Goodbye!")
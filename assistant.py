@@ -10,16 +10,27 @@ from langchain_community.tools import DuckDuckGoSearchRun
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
+import functools
+import time
+
+# How long a cached search result stays fresh (seconds)
+SEARCH_CACHE_TTL = 300
 
 def main():
     print("🤖 Initializing Real-Time AI Assistant...")
-    
+
     # Initialize the LLM (GPT-OSS 120B via Ollama)
     llm = OllamaLLM(model="gpt-oss:120b-cloud")
-    
+
     # Initialize the search tool (DuckDuckGo)
     search = DuckDuckGoSearchRun()
-    
+
+    # Cache search results so repeated questions skip the web round-trip;
+    # the bucket argument expires entries every SEARCH_CACHE_TTL seconds
+    @functools.lru_cache(maxsize=256)
+    def search_cached(question_norm, bucket):
+        return search.run(question_norm)
+
     # Create the prompt template
     prompt = ChatPromptTemplate.from_template("""
     You are a helpful AI assistant with access to real-time information.
@@ -41,7 +52,11 @@ def main():
     # 3. Passes both the question and search results to the LLM
     # 4. Returns the LLM's response
     chain = (
-        RunnablePassthrough.assign(context=lambda x: search.run(x["question"]))
+        RunnablePassthrough.assign(
+            context=lambda x: search_cached(
+                x["question"].strip().lower(), int(time.time() // SEARCH_CACHE_TTL)
+            )
+        )
         | prompt
         | llm
         | StrOutputParser()
@@ -65,12 +80,13 @@ def main():
                 continue
             
             print("🤖 Thinking...")
-            
-            # Run the chain with the user's question
-            response = chain.invoke({"question": user_question})
-            
-            print(f"🤖: {response}")
-            print()
+
+            # Stream the response so the user sees tokens as they are
+            # generated instead of waiting for the full answer
+            print("🤖: ", end="", flush=True)
+            for chunk in chain.stream({"question": user_question}):
+                print(chunk, end="", flush=True)
+            print("\n")
             
         except KeyboardInterrupt:
             print("\n🤖 Goodbye!")
@@ -6,122 +6,297 @@ Uses both qwen3-vl:235b-cloud and gpt-oss:120b-cloud for enhanced capabilities
 """
 
 from langchain_ollama import OllamaLLM
-from langchain_community.tools import DuckDuckGoSearchRun
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
+from collections import deque
 from datetime import datetime
 import asyncio
-import json
+import concurrent.futures
+import os
+import re
+import time
+import orjson
+from duckduckgo_search import AsyncDDGS
+
+# How long a cached search result stays fresh (seconds)
+SEARCH_CACHE_TTL = 300
+
+# Micro-batch tuning for the shared search queue
+SEARCH_BATCH_SIZE = 8
+SEARCH_BATCH_WINDOW = 0.075  # seconds
+
+class BatchedSearcher:
+    """Micro-batching front-end for DuckDuckGo searches.
+
+    Queries arriving within the batch window are collected and fanned
+    out concurrently over the async client, so bursts of searches
+    (multiple agents driving the assistant, or several pending turns)
+    share one flush instead of serializing round-trips.
+    """
+
+    def __init__(self, batch_size=SEARCH_BATCH_SIZE, window=SEARCH_BATCH_WINDOW):
+        self.batch_size = batch_size
+        self.window = window
+        self._queue = None
+        self._worker = None
+        self._loop = None
+
+    async def search(self, query):
+        """Queue a query and wait for its result"""
+        loop = asyncio.get_running_loop()
+        # The interactive loop drives each turn with its own asyncio.run,
+        # so respawn the queue/worker whenever the loop changes
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+        future = loop.create_future()
+        await self._queue.put((query, future))
+        return await future
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = self._loop.time() + self.window
+            # Collect whatever else arrives inside the batch window
+            while len(batch) < self.batch_size:
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            results = await asyncio.gather(
+                *(self._fetch(query) for query, _ in batch),
+                return_exceptions=True
+            )
+            for (_, future), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    async def _fetch(self, query):
+        async with AsyncDDGS() as ddgs:
+            results = await ddgs.atext(query, max_results=5)
+        return "\n".join(r.get("body", "") for r in results or [])
 
 class DualModelRAGAssistant:
     def __init__(self):
-        # Initialize both models
-        self.qwen_model = OllamaLLM(model="qwen3-vl:235b-cloud")
-        self.gpt_model = OllamaLLM(model="gpt-oss:120b-cloud")
-        self.search = DuckDuckGoSearchRun()
-        self.conversation_history = []
-        
+        # Initialize both models; keep_alive keeps them resident on the
+        # server between questions instead of being evicted and reloaded
+        self.qwen_model = OllamaLLM(model="qwen3-vl:235b-cloud", keep_alive="30m")
+        self.gpt_model = OllamaLLM(model="gpt-oss:120b-cloud", keep_alive="30m")
+        self.search = BatchedSearcher()
+        # Bounded deque of (unix_time, question, answer) tuples: appends
+        # evict the oldest in O(1) and nothing is string-formatted until
+        # actually rendered or saved
+        self.conversation_history = deque(maxlen=10)
+        # TTL'd search cache so repeated/rephrased questions skip the
+        # DuckDuckGo round-trip entirely; keyed (question, time bucket)
+        self._search_cache = {}
+        # Single worker keeps saves ordered while the REPL stays responsive
+        self._io_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        # Append-only JSONL log: every turn is persisted with one O(1)
+        # write instead of rewriting the whole file on 'save'
+        self._log_filename = "dual_model_conversation.jsonl"
+
+        # All prompts keep their static instructions in the system
+        # message (an unchanging prefix every turn) so Ollama's
+        # prefix-matched KV cache is reused across turns; the dynamic
+        # question/context only appear at the end of the prompt.
+
         # Prompt for model selection and coordination
-        self.coordinator_prompt = ChatPromptTemplate.from_template("""
-        You are a model coordinator. Analyze the user's question and determine which model(s) to use:
-        
-        Available models:
-        - qwen3-vl:235b-cloud - Best for: vision tasks, image analysis, multimodal content, Chinese language
-        - gpt-oss:120b-cloud - Best for: general reasoning, complex analysis, English text generation
-        
-        User question: {question}
-        Search context: {context}
-        
-        Respond with ONLY one of these options:
-        - "QWEN" - Use Qwen3-VL model only
-        - "GPT" - Use GPT-OSS model only  
-        - "BOTH" - Use both models and combine responses
-        - "QWEN_THEN_GPT" - Use Qwen first, then GPT to refine
-        """)
-        
+        self.coordinator_prompt = ChatPromptTemplate.from_messages([
+            ("system", """You are a model coordinator. Analyze the user's question and determine which model(s) to use:
+
+Available models:
+- qwen3-vl:235b-cloud - Best for: vision tasks, image analysis, multimodal content, Chinese language
+- gpt-oss:120b-cloud - Best for: general reasoning, complex analysis, English text generation
+
+Respond with ONLY one of these options:
+- "QWEN" - Use Qwen3-VL model only
+- "GPT" - Use GPT-OSS model only
+- "BOTH" - Use both models and combine responses
+- "QWEN_THEN_GPT" - Use Qwen first, then GPT to refine"""),
+            ("human", """User question: {question}
+Search context: {context}"""),
+        ])
+
         # Qwen-specific prompt
-        self.qwen_prompt = ChatPromptTemplate.from_template("""
-        You are Qwen3-VL, a multimodal AI assistant with vision capabilities.
-        Use the search context to provide accurate, current information.
-        
-        Search context: {context}
-        Question: {question}
-        
-        Provide a helpful response:
-        """)
-        
-        # GPT-specific prompt  
-        self.gpt_prompt = ChatPromptTemplate.from_template("""
-        You are GPT-OSS, a powerful reasoning AI assistant.
-        Use the search context to provide detailed, analytical responses.
-        
-        Search context: {context}
-        Question: {question}
-        
-        Provide a comprehensive response:
-        """)
-        
+        self.qwen_prompt = ChatPromptTemplate.from_messages([
+            ("system", """You are Qwen3-VL, a multimodal AI assistant with vision capabilities.
+Use the search context to provide accurate, current information."""),
+            ("human", """Search context: {context}
+Question: {question}
+
+Provide a helpful response:"""),
+        ])
+
+        # GPT-specific prompt
+        self.gpt_prompt = ChatPromptTemplate.from_messages([
+            ("system", """You are GPT-OSS, a powerful reasoning AI assistant.
+Use the search context to provide detailed, analytical responses."""),
+            ("human", """Search context: {context}
+Question: {question}
+
+Provide a comprehensive response:"""),
+        ])
+
         # Combination prompt
-        self.combination_prompt = ChatPromptTemplate.from_template("""
-        You are combining responses from two AI models. Create a unified, coherent answer.
-        
-        Original question: {question}
-        Search context: {context}
-        
-        Qwen3-VL response: {qwen_response}
-        GPT-OSS response: {gpt_response}
-        
-        Combine these responses into a single, comprehensive answer:
-        """)
-    
-    def search_with_error_handling(self, question):
-        """Search with error handling"""
+        self.combination_prompt = ChatPromptTemplate.from_messages([
+            ("system", "You are combining responses from two AI models. Create a unified, coherent answer."),
+            ("human", """Original question: {question}
+Search context: {context}
+
+Qwen3-VL response: {qwen_response}
+GPT-OSS response: {gpt_response}
+
+Combine these responses into a single, comprehensive answer:"""),
+        ])
+
+        # Compose each LCEL chain once; rebuilding prompt | model |
+        # parser on every call re-allocated the Runnables each time
+        self.coordinator_chain = self.coordinator_prompt | self.gpt_model | StrOutputParser()
+        self.qwen_chain = self.qwen_prompt | self.qwen_model | StrOutputParser()
+        self.gpt_chain = self.gpt_prompt | self.gpt_model | StrOutputParser()
+        self.combination_chain = self.combination_prompt | self.gpt_model | StrOutputParser()
+
+        # Command dispatch built once; a single dict lookup replaces the
+        # chained list-membership checks on every turn
+        self._commands = {
+            'exit': self._cmd_exit,
+            'quit': self._cmd_exit,
+            'bye': self._cmd_exit,
+            'goodbye': self._cmd_exit,
+            'save': self._cmd_save,
+            'clear': self._cmd_clear,
+            'clear history': self._cmd_clear,
+            'clear cache': self._cmd_clear_cache,
+            'clear search cache': self._cmd_clear_cache,
+            'models': self._cmd_models,
+        }
+
+        # Cheap routing rules tried before the LLM coordinator - a hit
+        # here saves a full 120B round-trip per turn. Order matters:
+        # vision/Chinese first, explicit dual-model requests second,
+        # reasoning keywords last.
+        self._route_rules = [
+            (re.compile(r"\b(image|picture|photo|screenshot|diagram|chart|vision|visual|multimodal)\b"
+                        r"|[一-鿿]", re.IGNORECASE), "QWEN"),
+            (re.compile(r"\b(both models?|second opinion|combine)\b", re.IGNORECASE), "BOTH"),
+            (re.compile(r"\b(analyze|analyse|compare|reason|prove|derive|step[- ]by[- ]step)\b",
+                        re.IGNORECASE), "GPT"),
+        ]
+
+        # The concurrent model calls only overlap if the Ollama server
+        # batches them; otherwise they queue serially per model
+        if not os.environ.get("OLLAMA_NUM_PARALLEL"):
+            print("💡 Tip: start the Ollama server with OLLAMA_NUM_PARALLEL=4 and "
+                  "OLLAMA_MAX_LOADED_MODELS=2 so concurrent requests are batched "
+                  "into the same decode loop instead of queueing")
+
+        self._warm_models()
+
+    def _warm_models(self):
+        """Fire a tiny generation at each model so the server pages in
+        weights now instead of during the first real question"""
+        print("🔥 Warming up both models...")
+
+        async def warm():
+            return await asyncio.gather(
+                self.qwen_model.ainvoke("ok"),
+                self.gpt_model.ainvoke("ok"),
+                return_exceptions=True,
+            )
+
+        try:
+            results = asyncio.run(warm())
+        except Exception as e:
+            print(f"⚠️ Model warm-up failed: {e}")
+            return
+
+        for name, result in zip(["Qwen3-VL", "GPT-OSS"], results):
+            if isinstance(result, Exception):
+                print(f"⚠️ {name} warm-up failed: {result}")
+            else:
+                print(f"🔥 {name} loaded and resident")
+
+    async def search_with_error_handling(self, question):
+        """Search with error handling and a 5-minute result cache"""
+        key = (question.strip().lower(), int(time.time() // SEARCH_CACHE_TTL))
+        cached = self._search_cache.get(key)
+        if cached is not None:
+            return cached
+
         try:
-            results = self.search.run(question)
-            return results
+            result = await self.search.search(key[0])
         except Exception as e:
             return f"Search unavailable: {str(e)}. Using model knowledge only."
+
+        self._search_cache[key] = result
+        # Bound the cache; oldest insertions go first
+        while len(self._search_cache) > 256:
+            self._search_cache.pop(next(iter(self._search_cache)))
+        return result
+
+    def clear_search_cache(self):
+        """Drop all cached search results"""
+        self._search_cache.clear()
     
-    def determine_model_strategy(self, question, context):
+    def _route(self, question):
+        """Heuristic strategy routing; returns None when no rule matches"""
+        for pattern, strategy in self._route_rules:
+            if pattern.search(question):
+                return strategy
+        # Short factual questions don't need a coordinator round-trip
+        if len(question.split()) <= 8:
+            return "GPT"
+        return None
+
+    async def determine_model_strategy(self, question, context):
         """Determine which model(s) to use"""
+        # Try the cheap regex rules first; only ambiguous questions pay
+        # for an LLM coordinator call
+        strategy = self._route(question)
+        if strategy is not None:
+            return strategy
+
         try:
-            coordinator_chain = self.coordinator_prompt | self.gpt_model | StrOutputParser()
-            strategy = coordinator_chain.invoke({
+            strategy = (await self.coordinator_chain.ainvoke({
                 "question": question,
                 "context": context
-            }).strip().upper()
-            
+            })).strip().upper()
+
             # Fallback to GPT if strategy is unclear
             if strategy not in ["QWEN", "GPT", "BOTH", "QWEN_THEN_GPT"]:
                 strategy = "GPT"
-                
+
             return strategy
         except Exception as e:
             print(f"⚠️ Strategy determination failed: {e}")
             return "GPT"  # Fallback
-    
-    def get_qwen_response(self, question, context):
+
+    async def get_qwen_response(self, question, context):
         """Get response from Qwen3-VL model"""
         try:
-            qwen_chain = self.qwen_prompt | self.qwen_model | StrOutputParser()
-            return qwen_chain.invoke({"question": question, "context": context})
+            return await self.qwen_chain.ainvoke({"question": question, "context": context})
         except Exception as e:
             return f"Qwen model error: {str(e)}"
-    
-    def get_gpt_response(self, question, context):
+
+    async def get_gpt_response(self, question, context):
         """Get response from GPT-OSS model"""
         try:
-            gpt_chain = self.gpt_prompt | self.gpt_model | StrOutputParser()
-            return gpt_chain.invoke({"question": question, "context": context})
+            return await self.gpt_chain.ainvoke({"question": question, "context": context})
         except Exception as e:
             return f"GPT model error: {str(e)}"
-    
-    def combine_responses(self, question, context, qwen_response, gpt_response):
+
+    async def combine_responses(self, question, context, qwen_response, gpt_response):
         """Combine responses from both models"""
         try:
-            combination_chain = self.combination_prompt | self.gpt_model | StrOutputParser()
-            return combination_chain.invoke({
+            return await self.combination_chain.ainvoke({
                 "question": question,
                 "context": context,
                 "qwen_response": qwen_response,
@@ -130,107 +305,165 @@ class DualModelRAGAssistant:
         except Exception as e:
             # Fallback: simple concatenation
             return f"**Combined Response:**\n\n**Qwen3-VL:** {qwen_response}\n\n**GPT-OSS:** {gpt_response}"
-    
-    def process_question(self, question):
+
+    async def process_question(self, question):
         """Main processing logic using both models"""
         print("🔍 Searching web...")
-        context = self.search_with_error_handling(question)
-        
+        context = await self.search_with_error_handling(question)
+
+        # Speculatively launch both model calls alongside the coordinator,
+        # so its decision just picks from already-in-flight responses
+        # instead of paying a full extra round-trip up front
+        qwen_task = asyncio.ensure_future(self.get_qwen_response(question, context))
+        gpt_task = asyncio.ensure_future(self.get_gpt_response(question, context))
+
         print("🤖 Determining optimal model strategy...")
-        strategy = self.determine_model_strategy(question, context)
+        strategy = await self.determine_model_strategy(question, context)
         print(f"📋 Strategy: {strategy}")
-        
+
         if strategy == "QWEN":
             print("🟡 Using Qwen3-VL model...")
-            response = self.get_qwen_response(question, context)
+            gpt_task.cancel()  # Not needed - stop spending tokens on it
+            response = await qwen_task
             model_info = "**Model Used:** Qwen3-VL"
-            
+
         elif strategy == "GPT":
             print("🔵 Using GPT-OSS model...")
-            response = self.get_gpt_response(question, context)
+            qwen_task.cancel()
+            response = await gpt_task
             model_info = "**Model Used:** GPT-OSS"
-            
+
         elif strategy == "BOTH":
-            print("🟡 Getting Qwen3-VL response...")
-            qwen_response = self.get_qwen_response(question, context)
-            print("🔵 Getting GPT-OSS response...")
-            gpt_response = self.get_gpt_response(question, context)
+            print("🟡🔵 Waiting for both models...")
+            qwen_response, gpt_response = await asyncio.gather(qwen_task, gpt_task)
             print("🔄 Combining responses...")
-            response = self.combine_responses(question, context, qwen_response, gpt_response)
+            response = await self.combine_responses(question, context, qwen_response, gpt_response)
             model_info = "**Models Used:** Qwen3-VL + GPT-OSS (Combined)"
-            
+
         elif strategy == "QWEN_THEN_GPT":
             print("🟡 Getting Qwen3-VL response...")
-            qwen_response = self.get_qwen_response(question, context)
+            gpt_task.cancel()  # GPT needs Qwen's output, so the speculative call is wasted
+            qwen_response = await qwen_task
             print("🔵 Refining with GPT-OSS...")
             refined_context = f"Previous analysis: {qwen_response}\n\nOriginal context: {context}"
-            response = self.get_gpt_response(question, refined_context)
+            response = await self.get_gpt_response(question, refined_context)
             model_info = "**Models Used:** Qwen3-VL → GPT-OSS (Sequential)"
-        
+
         return f"{model_info}\n\n{response}"
     
     def add_to_history(self, question, answer):
         """Add to conversation history"""
-        timestamp = datetime.now().strftime("%H:%M")
-        self.conversation_history.extend([
-            f"[{timestamp}] {question}",
-            f"[{timestamp}] {answer[:300]}..."  # Truncate for history
-        ])
-        
-        if len(self.conversation_history) > 20:
-            self.conversation_history = self.conversation_history[-20:]
+        # Store the raw timestamp; it only gets formatted if a save
+        # actually needs it. Truncate the answer once at write time -
+        # readers use the stored text as-is
+        answer_trunc = answer if len(answer) <= 300 else answer[:300] + "…"
+        timestamp = time.time()
+        self.conversation_history.append((timestamp, question, answer_trunc))
+
+        # Persist the turn incrementally; crash-safe and O(1) per turn
+        self._io_executor.submit(
+            self._append_log, {"t": timestamp, "q": question, "a": answer_trunc}
+        )
     
-    def save_conversation(self, filename="dual_model_conversation.json"):
-        """Save conversation to file"""
+    def _append_log(self, record):
+        """Runs on the I/O executor: append one turn to the JSONL log"""
+        try:
+            with open(self._log_filename, 'ab') as f:
+                f.write(orjson.dumps(record) + b"\n")
+        except Exception as e:
+            print(f"❌ Could not append to {self._log_filename}: {e}")
+
+    def _export_json(self, filename):
+        """Runs on the I/O executor: coalesce the JSONL log into the
+        nested JSON format; timestamps get formatted here, the only
+        place they're shown"""
+        history = []
+        try:
+            with open(self._log_filename, 'rb') as f:
+                for line in f:
+                    if line.strip():
+                        record = orjson.loads(line)
+                        history.append({
+                            "time": datetime.fromtimestamp(record["t"]).strftime("%H:%M"),
+                            "question": record["q"],
+                            "answer": record["a"],
+                        })
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"❌ Could not read {self._log_filename}: {e}")
+            return
+
         conversation_data = {
             "timestamp": datetime.now().isoformat(),
             "models_used": ["qwen3-vl:235b-cloud", "gpt-oss:120b-cloud"],
-            "history": self.conversation_history
+            "history": history
         }
-        
         try:
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(conversation_data, f, indent=2, ensure_ascii=False)
+            # orjson serializes straight to UTF-8 bytes, much faster
+            # than stdlib json on long Unicode-heavy histories
+            with open(filename, 'wb') as f:
+                f.write(orjson.dumps(conversation_data, option=orjson.OPT_INDENT_2))
             print(f"💾 Conversation saved to {filename}")
         except Exception as e:
             print(f"❌ Could not save conversation: {e}")
+
+    def save_conversation(self, filename="dual_model_conversation.json"):
+        """Export the conversation as nested JSON in the background.
+
+        Turns are already persisted incrementally to the JSONL log, so
+        this just builds the human-friendly view on demand.
+        """
+        self._io_executor.submit(self._export_json, filename)
     
+    def _cmd_exit(self):
+        print("🤖 Goodbye! Thanks for using the dual-model assistant!")
+        return False
+
+    def _cmd_save(self):
+        self.save_conversation()
+        return True
+
+    def _cmd_clear(self):
+        self.conversation_history.clear()
+        print("🤖 Conversation history cleared!")
+        return True
+
+    def _cmd_clear_cache(self):
+        self.clear_search_cache()
+        print("🤖 Search cache cleared!")
+        return True
+
+    def _cmd_models(self):
+        print("🟡 Qwen3-VL: qwen3-vl:235b-cloud - Vision, multimodal tasks")
+        print("🔵 GPT-OSS: gpt-oss:120b-cloud - General reasoning, analysis")
+        return True
+
     def run(self):
         """Main interactive loop"""
         print("🤖 Dual-Model Real-Time AI Assistant is ready!")
         print("🟡 Qwen3-VL: Vision, multimodal, Chinese language")
         print("🔵 GPT-OSS: General reasoning, complex analysis")
         print("🔄 Smart model selection and combination")
-        print("📋 Commands: 'exit', 'save', 'clear', 'models'")
+        print("📋 Commands: 'exit', 'save', 'clear', 'clear cache', 'models'")
         print("\n🤖 Hello! I can use both models to give you the best answers. What would you like to know?")
-        
+
         while True:
             try:
                 user_question = input("\nYou: ").strip()
-                
-                if user_question.lower() in ['exit', 'quit', 'bye', 'goodbye']:
-                    print("🤖 Goodbye! Thanks for using the dual-model assistant!")
-                    break
-                
-                if user_question.lower() == 'save':
-                    self.save_conversation()
-                    continue
-                
-                if user_question.lower() in ['clear', 'clear history']:
-                    self.conversation_history = []
-                    print("🤖 Conversation history cleared!")
-                    continue
-                
-                if user_question.lower() == 'models':
-                    print("🟡 Qwen3-VL: qwen3-vl:235b-cloud - Vision, multimodal tasks")
-                    print("🔵 GPT-OSS: gpt-oss:120b-cloud - General reasoning, analysis")
+
+                # Handle special commands; handlers return False to quit
+                handler = self._commands.get(user_question.lower())
+                if handler is not None:
+                    if not handler():
+                        break
                     continue
-                
+
                 if not user_question:
                     continue
                 
                 # Process with dual models
-                response = self.process_question(user_question)
+                response = asyncio.run(self.process_question(user_question))
                 
                 # Add to history and display
                 self.add_to_history(user_question, response)
@@ -4,90 +4,105 @@ Gets responses from both qwen3-vl:235b-cloud and gpt-oss:120b-cloud
 and presents them side by side for comparison
 """
 
+import asyncio
+import functools
+import time
+
 from langchain_ollama import OllamaLLM
 from langchain_community.tools import DuckDuckGoSearchRun
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import RunnableLambda, RunnableParallel
 from langchain_core.output_parsers import StrOutputParser
 
-def main():
+async def main():
     print("🤖 Initializing Dual-Model Real-Time AI Assistant...")
     print("🟡 Loading Qwen3-VL (235B Cloud)...")
     print("🔵 Loading GPT-OSS (120B Cloud)...")
-    
+
     # Initialize both models
     qwen_model = OllamaLLM(model="qwen3-vl:235b-cloud")
     gpt_model = OllamaLLM(model="gpt-oss:120b-cloud")
-    
+
     # Initialize search
     search = DuckDuckGoSearchRun()
-    
+
+    # Cache search results so repeated questions skip the web round-trip;
+    # the bucket argument expires entries every 5 minutes
+    @functools.lru_cache(maxsize=256)
+    def search_cached(question_norm, bucket):
+        return search.run(question_norm)
+
     # Create prompts for both models
     qwen_prompt = ChatPromptTemplate.from_template("""
     You are Qwen3-VL, a multimodal AI assistant with vision capabilities.
     Use the following context from web search to answer the user's question.
-    
+
     Context: {context}
     Question: {question}
-    
+
     Provide a helpful answer:
     """)
-    
+
     gpt_prompt = ChatPromptTemplate.from_template("""
     You are GPT-OSS, a powerful reasoning AI assistant.
     Use the following context from web search to answer the user's question.
-    
+
     Context: {context}
     Question: {question}
-    
+
     Provide a comprehensive answer:
     """)
-    
-    # Build chains for both models
-    qwen_chain = (
-        RunnablePassthrough.assign(context=lambda x: search.run(x["question"]))
-        | qwen_prompt
-        | qwen_model
-        | StrOutputParser()
-    )
-    
-    gpt_chain = (
-        RunnablePassthrough.assign(context=lambda x: search.run(x["question"]))
-        | gpt_prompt
-        | gpt_model
-        | StrOutputParser()
+
+    # Build chains for both models (context is passed in directly so we
+    # only hit the search engine once per question), then fuse them into
+    # one parallel runnable - LangChain schedules both branches
+    # concurrently from a single invoke. Each branch catches its own
+    # errors so one model failing still shows the other's answer.
+    def guard(chain, label):
+        async def run(inputs):
+            try:
+                return await chain.ainvoke(inputs)
+            except Exception as e:
+                return f"{label} Error: {str(e)}"
+        return RunnableLambda(run)
+
+    qwen_chain = qwen_prompt | qwen_model | StrOutputParser()
+    gpt_chain = gpt_prompt | gpt_model | StrOutputParser()
+    dual_chain = RunnableParallel(
+        qwen=guard(qwen_chain, "Qwen3-VL"),
+        gpt=guard(gpt_chain, "GPT-OSS"),
     )
-    
+
     print("🤖 Dual-Model Assistant Ready!")
     print("🤖 I'll show you responses from both models for comparison.")
     print("🤖 Hello! What would you like to know?")
-    
+
     while True:
         try:
             user_question = input("\nYou: ").strip()
-            
+
             if user_question.lower() in ['exit', 'quit', 'bye', 'goodbye']:
                 print("🤖 Goodbye!")
                 break
-            
+
             if not user_question:
                 continue
-            
+
             print("🔍 Searching web and thinking with both models...")
-            
-            # Get responses from both models
-            print("🟡 Getting Qwen3-VL response...")
-            try:
-                qwen_response = qwen_chain.invoke({"question": user_question})
-            except Exception as e:
-                qwen_response = f"Qwen3-VL Error: {str(e)}"
-            
-            print("🔵 Getting GPT-OSS response...")
-            try:
-                gpt_response = gpt_chain.invoke({"question": user_question})
-            except Exception as e:
-                gpt_response = f"GPT-OSS Error: {str(e)}"
-            
+
+            # Search once and share the context between both models
+            search_result = await asyncio.to_thread(
+                search_cached, user_question.strip().lower(), int(time.time() // 300)
+            )
+
+            # One invoke runs both branches concurrently - the calls are
+            # I/O-bound HTTP, so overlapping them roughly halves wall time
+            results = await dual_chain.ainvoke(
+                {"question": user_question, "context": search_result}
+            )
+            qwen_response = results["qwen"]
+            gpt_response = results["gpt"]
+
             # Display both responses
             print("\n" + "="*80)
             print("🟡 QWEN3-VL RESPONSE:")
@@ -98,7 +113,7 @@ def main():
             print("-" * 40)
             print(gpt_response)
             print("="*80)
-            
+
         except KeyboardInterrupt:
             print("\n🤖 Goodbye!")
             break
@@ -107,4 +122,4 @@ def main():
             print("🤖 Please try again.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    asyncio.run(main())